@@ -0,0 +1,248 @@
+"""Admin login shared by the Friday and Saturday apps.
+
+Each app passes its own SQLite database path; the login state (rate limit
+buckets and remembered sessions) is stored there so lockouts survive reruns
+and restarts.
+
+Admin passwords are stored in st.secrets["password"] as
+"pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>"; generate one with
+hash_password(). Plain SHA-256 hex digests are still accepted.
+
+Login attempts are rate limited per client IP. When the app runs behind a
+reverse proxy (Streamlit Community Cloud, nginx, ...), every request arrives
+from the proxy's address, so set TENNIS_TRUSTED_PROXIES to the number of
+proxies in front of the app; otherwise all visitors share one bucket and a
+few bad guesses by anyone lock the admin out. If no client address can be
+determined at all, admin login is refused.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
+import time
+
+import streamlit as st
+
+from app_metrics import timed
+
+PBKDF2_ITERATIONS = 600_000
+ADMIN_SESSION_SECONDS = 12 * 60 * 60  # Login lifetime within one browser session
+# Token bucket per client IP: 3 login attempts, then one more every 10 minutes
+LOGIN_BUCKET_CAPACITY = 3
+LOGIN_REFILL_PER_SECOND = 1 / (10 * 60)
+# Buckets untouched for this long are full again and can be dropped
+LOGIN_BUCKET_FULL_SECONDS = LOGIN_BUCKET_CAPACITY / LOGIN_REFILL_PER_SECOND
+# "Remember me" keeps a token in the URL so a refresh stays logged in. It is
+# tied to the client's IP, replaced every time it is used and lasts an hour.
+REMEMBER_ME_SECONDS = 60 * 60
+# Number of reverse proxies in front of the app whose X-Forwarded-For entries
+# can be trusted; with 0 only the connection's own address is used
+TRUSTED_PROXIES = int(os.environ.get('TENNIS_TRUSTED_PROXIES', '0'))
+
+logger = logging.getLogger('tennis_admin_auth')
+_warned_about_proxy = False
+
+def init_auth_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS admin_sessions
+                 (token_hash TEXT PRIMARY KEY, client TEXT, expires_at REAL)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS rate_limits
+                 (client TEXT PRIMARY KEY, tokens REAL, updated_at REAL)''')
+
+def hash_password(password, salt=None, iterations=PBKDF2_ITERATIONS):
+    salt = salt or secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored):
+    if stored.startswith("pbkdf2_sha256$"):
+        _, iterations, salt, expected = stored.split("$")
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), int(iterations))
+        return hmac.compare_digest(digest.hex(), expected)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+
+# Function to get the client's IP address, or None if Streamlit doesn't know it.
+# Each trusted proxy appends the address it got the request from to
+# X-Forwarded-For, so the client is the entry added by the outermost one;
+# anything further left was sent by the client and can't be trusted.
+def get_client_ip():
+    forwarded = get_forwarded_for()
+    if TRUSTED_PROXIES:
+        if len(forwarded) >= TRUSTED_PROXIES:
+            return forwarded[-TRUSTED_PROXIES]
+    return getattr(getattr(st, 'context', None), 'ip_address', None)
+
+def get_forwarded_for():
+    headers = getattr(getattr(st, 'context', None), 'headers', None) or {}
+    return [part.strip() for part in headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+
+# Function to tell whether the request came through a proxy while
+# TENNIS_TRUSTED_PROXIES is unset, i.e. every visitor is seen with the proxy's
+# address. Logged once per process.
+def behind_untrusted_proxy():
+    global _warned_about_proxy
+    if TRUSTED_PROXIES or not get_forwarded_for():
+        return False
+    if not _warned_about_proxy:
+        _warned_about_proxy = True
+        logger.warning("Requests arrive through a proxy but TENNIS_TRUSTED_PROXIES is not set; "
+                       "all visitors share one login rate limit.")
+    return True
+
+def bucket_tokens(row, now):
+    if row is None:
+        return LOGIN_BUCKET_CAPACITY
+    return min(LOGIN_BUCKET_CAPACITY, row[0] + (now - row[1]) * LOGIN_REFILL_PER_SECOND)
+
+# Function to check whether a login attempt would be allowed, without writing
+@timed
+def login_allowed(db_path, client_ip):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT tokens, updated_at FROM rate_limits WHERE client = ?", (client_ip,))
+    allowed = bucket_tokens(c.fetchone(), time.time()) >= 1
+    conn.close()
+    return allowed
+
+# Function to spend a token from the client's bucket. Runs in one IMMEDIATE
+# transaction so concurrent sessions can't both take the last token.
+@timed
+def take_login_token(db_path, client_ip):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    now = time.time()
+    c.execute("SELECT tokens, updated_at FROM rate_limits WHERE client = ?", (client_ip,))
+    tokens = bucket_tokens(c.fetchone(), now)
+    allowed = tokens >= 1
+    if allowed:
+        c.execute("REPLACE INTO rate_limits (client, tokens, updated_at) VALUES (?, ?, ?)",
+                  (client_ip, tokens - 1, now))
+    c.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - LOGIN_BUCKET_FULL_SECONDS,))
+    c.execute("COMMIT")
+    conn.close()
+    return allowed
+
+# Function to refill the client's bucket after a successful login
+@timed
+def reset_login_tokens(db_path, client_ip):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("DELETE FROM rate_limits WHERE client = ?", (client_ip,))
+    conn.commit()
+    conn.close()
+
+# Remembered admin sessions are stored server-side by the SHA-256 of their
+# token along with the IP they were issued to
+@timed
+def create_admin_session(db_path, client_ip, expires_at):
+    token = secrets.token_urlsafe(32)
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("DELETE FROM admin_sessions WHERE expires_at < ?", (time.time(),))
+    c.execute("INSERT INTO admin_sessions (token_hash, client, expires_at) VALUES (?, ?, ?)",
+              (hashlib.sha256(token.encode()).hexdigest(), client_ip, expires_at))
+    conn.commit()
+    conn.close()
+    return token
+
+# Function to swap a remembered token for a new one with the same expiry, so
+# a copied link stops working once the admin's browser has used it. Returns
+# (token, expires_at), or (None, None) if the token is expired, unknown or
+# was issued to a different IP.
+@timed
+def rotate_admin_session(db_path, token, client_ip):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    c.execute("SELECT client, expires_at FROM admin_sessions WHERE token_hash = ?", (token_hash,))
+    result = c.fetchone()
+    if not result or result[0] != client_ip or result[1] <= time.time():
+        c.execute("COMMIT")
+        conn.close()
+        return None, None
+    new_token = secrets.token_urlsafe(32)
+    c.execute("DELETE FROM admin_sessions WHERE token_hash = ?", (token_hash,))
+    c.execute("INSERT INTO admin_sessions (token_hash, client, expires_at) VALUES (?, ?, ?)",
+              (hashlib.sha256(new_token.encode()).hexdigest(), client_ip, result[1]))
+    c.execute("COMMIT")
+    conn.close()
+    return new_token, result[1]
+
+@timed
+def delete_admin_session(db_path, token):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("DELETE FROM admin_sessions WHERE token_hash = ?",
+              (hashlib.sha256(token.encode()).hexdigest(),))
+    conn.commit()
+    conn.close()
+
+def logout_admin(db_path):
+    token = st.session_state.pop("admin_token", None)
+    if token:
+        delete_admin_session(db_path, token)
+    st.session_state.pop("admin_expires", None)
+    st.session_state.pop("password_correct", None)
+    if "admin" in st.query_params:
+        del st.query_params["admin"]
+
+def check_password(db_path):
+    """Returns `True` if the user has a valid admin session."""
+    # A verified login is cached in session_state, so the password is only
+    # hashed when it is submitted
+    if st.session_state.get("admin_expires", 0) > time.time():
+        return True
+    client_ip = get_client_ip()
+    if not client_ip:
+        st.error("Admin login is unavailable: the client address can't be determined. "
+                 "If the app is behind a proxy, set TENNIS_TRUSTED_PROXIES.")
+        return False
+    if behind_untrusted_proxy():
+        st.warning("The app is behind a proxy but TENNIS_TRUSTED_PROXIES is not set, "
+                   "so login attempts from everyone share one limit.")
+    token = st.query_params.get("admin")
+    if token:
+        del st.query_params["admin"]
+        new_token, expires_at = rotate_admin_session(db_path, token, client_ip)
+        if new_token:
+            st.session_state["admin_token"] = new_token
+            st.session_state["admin_expires"] = expires_at
+            st.query_params["admin"] = new_token
+            return True
+
+    if not login_allowed(db_path, client_ip):
+        st.error("Too many incorrect attempts. Please try again later.")
+        return False
+
+    def password_entered():
+        """Checks whether a password entered by the user is correct."""
+        # Spend a token before hashing so other tabs or sessions can't keep
+        # guessing once the limit is reached
+        if not take_login_token(db_path, client_ip):
+            st.session_state["password_correct"] = False
+            del st.session_state["password"]
+            return
+        if verify_password(st.session_state["password"], st.secrets["password"]):
+            st.session_state["admin_expires"] = time.time() + ADMIN_SESSION_SECONDS
+            if st.session_state.get("remember_admin"):
+                expires_at = time.time() + REMEMBER_ME_SECONDS
+                token = create_admin_session(db_path, client_ip, expires_at)
+                st.session_state["admin_token"] = token
+                st.session_state["admin_expires"] = expires_at
+                st.query_params["admin"] = token
+            st.session_state["password_correct"] = True
+            reset_login_tokens(db_path, client_ip)
+            del st.session_state["password"]  # Don't store the password.
+        else:
+            st.session_state["password_correct"] = False
+
+    st.checkbox("Remember me on this device for an hour", key="remember_admin")
+    st.text_input(
+        "Admin Login", type="password", on_change=password_entered, key="password"
+    )
+    if st.session_state.get("password_correct") is False:
+        st.error("😕 Password incorrect")
+    return False
@@ -0,0 +1,98 @@
+"""Opt-in timing instrumentation shared by the Friday and Saturday apps.
+
+Timing is off unless TENNIS_METRICS=1. When it is off, @timed returns the
+function unchanged, so there is no overhead. Set TENNIS_METRICS_FILE to also
+write the metrics in Prometheus text format.
+
+Metrics are kept in this module rather than in the app script. Streamlit
+imports the module once per process, so the totals survive reruns and are
+shared across sessions.
+"""
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+METRICS_ENABLED = os.environ.get('TENNIS_METRICS') == '1'
+METRICS_FILE = os.environ.get('TENNIS_METRICS_FILE')
+
+logger = logging.getLogger('tennis_metrics')
+if METRICS_ENABLED and not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+# {name: {'count', 'total', 'max'}} for timings plus plain counters, guarded
+# by one lock since each session's rerun runs in its own thread
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+
+def record_timing(name, seconds):
+    with _lock:
+        timing = _timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+    logger.info(json.dumps({'event': 'timing', 'name': name, 'seconds': round(seconds, 6)}))
+
+def record_count(name, value=1):
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+    logger.info(json.dumps({'event': 'count', 'name': name, 'value': value}))
+
+def timed(func):
+    if not METRICS_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_timing(func.__name__, time.perf_counter() - start)
+    return wrapper
+
+# Function to build the admin metrics table
+def metrics_dataframe():
+    with _lock:
+        rows = [{'Function': name, 'Calls': t['count'], 'Total (ms)': round(t['total'] * 1000, 2),
+                 'Avg (ms)': round(t['total'] / t['count'] * 1000, 2), 'Max (ms)': round(t['max'] * 1000, 2)}
+                for name, t in sorted(_timings.items())]
+        attempts = _counters.get('generate_schedule_attempts', 0)
+        generate = dict(_timings.get('generate_schedule') or {})
+    if attempts and generate:
+        rows.append({'Function': 'generate_schedule (per attempt)', 'Calls': attempts,
+                     'Total (ms)': round(generate['total'] * 1000, 2),
+                     'Avg (ms)': round(generate['total'] / attempts * 1000, 3), 'Max (ms)': None})
+    return pd.DataFrame(rows)
+
+# Function to write the metrics in Prometheus text exposition format. Each
+# write goes to its own temp file in the same directory and is renamed over
+# the target while holding the lock, so concurrent reruns can't trip over
+# each other and scrapers never see a half-written file.
+def write_prometheus(path):
+    with _lock:
+        lines = ['# HELP tennis_call_seconds Time spent in instrumented functions.',
+                 '# TYPE tennis_call_seconds summary']
+        for name, t in sorted(_timings.items()):
+            lines.append(f'tennis_call_seconds_sum{{function="{name}"}} {t["total"]:.6f}')
+            lines.append(f'tennis_call_seconds_count{{function="{name}"}} {t["count"]}')
+        lines += ['# HELP tennis_call_seconds_max Slowest call of instrumented functions.',
+                  '# TYPE tennis_call_seconds_max gauge']
+        for name, t in sorted(_timings.items()):
+            lines.append(f'tennis_call_seconds_max{{function="{name}"}} {t["max"]:.6f}')
+        for name, value in sorted(_counters.items()):
+            lines.append(f'# TYPE tennis_{name}_total counter')
+            lines.append(f'tennis_{name}_total {value}')
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(path)),
+                                         prefix='.metrics-', delete=False) as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(f.name, path)
@@ -0,0 +1,196 @@
+"""Change history shared by the Friday and Saturday apps.
+
+Every change to a date's players or schedule is appended to the events table
+in the same transaction as the change itself, so the admin can see what
+happened and put a date back to how it was after any event. The players and
+schedules tables stay the materialized current state.
+
+The apps store different player rows, so functions that read or write them
+take player_columns, the players table columns that make up a sign-up:
+('name',) for Friday, ('name', 'availability') for Saturday. A player in a
+logged state is the bare name when that is the only column, otherwise a list
+of the column values, matching the sign-up event's payload keys.
+"""
+import datetime
+import json
+import sqlite3
+
+import streamlit as st
+
+from app_metrics import timed
+
+# Take a snapshot after this many events for a date so replay stays short
+SNAPSHOT_INTERVAL = 50
+
+# Function to create the events and snapshots tables. The first time, dates
+# with sign-ups or a schedule from before the log existed get a baseline event
+# holding that state, so replaying the log doesn't lose them.
+def init_event_tables(c, player_columns):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events'")
+    first_run = c.fetchone() is None
+    c.execute('''CREATE TABLE IF NOT EXISTS events
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, event_type TEXT,
+                  payload TEXT, created_at TEXT)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_events_date ON events (date, id)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS snapshots
+                 (event_id INTEGER PRIMARY KEY, date TEXT, state TEXT)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_snapshots_date ON snapshots (date, event_id)''')
+    if not first_run:
+        return
+    c.execute("SELECT date FROM players UNION SELECT date FROM schedules")
+    for (date,) in c.fetchall():
+        c.execute(f"SELECT {', '.join(player_columns)} FROM players WHERE date = ? ORDER BY id", (date,))
+        baseline_players = [player_entry(row, player_columns) for row in c.fetchall()]
+        c.execute("SELECT schedule_data FROM schedules WHERE date = ?", (date,))
+        row = c.fetchone()
+        baseline_schedule = json.loads(row[0]) if row else None
+        append_event(c, date, 'baseline', {'state': {'players': baseline_players, 'schedule': baseline_schedule}},
+                     player_columns)
+
+# Function to turn a players row (or a sign-up's values) into a state entry
+def player_entry(values, player_columns):
+    return values[0] if len(player_columns) == 1 else list(values)
+
+def player_name(entry, player_columns):
+    return entry if len(player_columns) == 1 else entry[0]
+
+def is_scheduled(name, schedule):
+    for matchups in schedule.values():
+        # Saturday sessions map courts to matchups; older schedules and
+        # Friday's are plain lists
+        if isinstance(matchups, dict):
+            matchups = matchups.values()
+        if any(name in matchup for matchup in matchups):
+            return True
+    return False
+
+# Function to apply one logged event to a date's state,
+# {'players': [entry, ...], 'schedule': schedule or None}
+def apply_event(state, event_type, payload, player_columns):
+    if event_type == 'signup':
+        entry = player_entry([payload[column] for column in player_columns], player_columns)
+        return {**state, 'players': state['players'] + [entry]}
+    if event_type == 'remove':
+        return {**state, 'players': [p for p in state['players']
+                                     if player_name(p, player_columns) != payload['name']]}
+    if event_type == 'players_cleared':
+        return {**state, 'players': []}
+    if event_type == 'generate':
+        return {**state, 'schedule': payload['schedule']}
+    if event_type == 'schedule_cleared':
+        return {**state, 'schedule': None}
+    if event_type in ('baseline', 'restore'):
+        return payload['state']
+    return state
+
+# Function to append an event on an open cursor, so it commits together with
+# the change to the materialized tables
+def append_event(c, date, event_type, payload, player_columns):
+    created_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    c.execute("INSERT INTO events (date, event_type, payload, created_at) VALUES (?, ?, ?, ?)",
+              (date, event_type, json.dumps(payload), created_at))
+    event_id = c.lastrowid
+    c.execute("SELECT COALESCE(MAX(event_id), 0) FROM snapshots WHERE date = ?", (date,))
+    last_snapshot = c.fetchone()[0]
+    c.execute("SELECT COUNT(*) FROM events WHERE date = ? AND id > ?", (date, last_snapshot))
+    if c.fetchone()[0] >= SNAPSHOT_INTERVAL:
+        state = replay_events(c, date, event_id, player_columns)
+        c.execute("INSERT INTO snapshots (event_id, date, state) VALUES (?, ?, ?)",
+                  (event_id, date, json.dumps(state)))
+    return event_id
+
+# Function to rebuild a date's state as of an event: start from the latest
+# snapshot at or before it and replay the events after that
+def replay_events(c, date, event_id, player_columns):
+    c.execute("SELECT event_id, state FROM snapshots WHERE date = ? AND event_id <= ? "
+              "ORDER BY event_id DESC LIMIT 1", (date, event_id))
+    snapshot = c.fetchone()
+    if snapshot:
+        start_id, state = snapshot[0], json.loads(snapshot[1])
+    else:
+        start_id, state = 0, {'players': [], 'schedule': None}
+    c.execute("SELECT event_type, payload FROM events WHERE date = ? AND id > ? AND id <= ? ORDER BY id",
+              (date, start_id, event_id))
+    for event_type, payload in c.fetchall():
+        state = apply_event(state, event_type, json.loads(payload), player_columns)
+    return state
+
+@timed
+def get_events(db_path, date):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT id, event_type, payload, created_at FROM events WHERE date = ? ORDER BY id DESC",
+              (date,))
+    events = [(row[0], row[1], json.loads(row[2]), row[3]) for row in c.fetchall()]
+    conn.close()
+    return events
+
+# Function to put a date back to how it was right after the given event. The
+# restore is itself logged, so it can be undone too. Schedules tables with an
+# updated_at column (Saturday's, read by the feed) get it refreshed.
+@timed
+def restore_to_event(db_path, date, event_id, player_columns):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    state = replay_events(c, date, event_id, player_columns)
+    c.execute("DELETE FROM players WHERE date = ?", (date,))
+    rows = [[entry] if len(player_columns) == 1 else entry for entry in state['players']]
+    c.executemany(f"INSERT INTO players ({', '.join(player_columns)}, date) "
+                  f"VALUES ({', '.join('?' for _ in player_columns)}, ?)",
+                  [(*row, date) for row in rows])
+    c.execute("DELETE FROM schedules WHERE date = ?", (date,))
+    if state['schedule'] is not None:
+        columns = [row[1] for row in c.execute("PRAGMA table_info(schedules)")]
+        if 'updated_at' in columns:
+            updated_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            c.execute("INSERT INTO schedules (date, schedule_data, updated_at) VALUES (?, ?, ?)",
+                      (date, json.dumps(state['schedule']), updated_at))
+        else:
+            c.execute("INSERT INTO schedules (date, schedule_data) VALUES (?, ?)",
+                      (date, json.dumps(state['schedule'])))
+    append_event(c, date, 'restore', {'event_id': event_id, 'state': state}, player_columns)
+    conn.commit()
+    conn.close()
+
+# Function to describe an event for the admin history list
+def describe_event(event_type, payload):
+    if event_type == 'signup':
+        return f"{payload['name']} signed up"
+    if event_type == 'remove':
+        return f"{payload['name']} removed"
+    if event_type == 'players_cleared':
+        return "Players cleared"
+    if event_type == 'generate':
+        return "Schedule generated"
+    if event_type == 'schedule_cleared':
+        return "Schedule cleared"
+    if event_type == 'restore':
+        return f"Restored to #{payload['event_id']}"
+    if event_type == 'baseline':
+        return "History starts"
+    return event_type
+
+# Admin panel to remove a player or roll the date back to an earlier point.
+# schedule is the published schedule or None; remove_player(name, date) is the
+# app's own, since it knows how to clear the schedule.
+def show_history(db_path, date, players, schedule, remove_player, player_columns):
+    with st.expander("🕓  History"):
+        if players:
+            removed = st.selectbox("Remove a player", players, key='remove_player')
+            if schedule and is_scheduled(removed, schedule):
+                st.warning(f"{removed} is on the schedule; removing them clears it so it can be regenerated.")
+            if st.button("Remove player"):
+                remove_player(removed, date)
+                st.rerun()
+        events = get_events(db_path, date)
+        if not events:
+            st.write("No changes recorded for this date.")
+            return
+        labels = {event_id: f"#{event_id} {created_at} UTC: {describe_event(event_type, payload)}"
+                  for event_id, event_type, payload, created_at in events}
+        event_id = st.selectbox("Restore to just after", list(labels), format_func=labels.get,
+                                key='restore_event')
+        if st.button("⏪  Restore"):
+            restore_to_event(db_path, date, event_id, player_columns)
+            st.success("Restored.")
+            st.rerun()
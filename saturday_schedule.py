@@ -0,0 +1,52 @@
+"""Saturday schedule definitions shared by tennis_saturday.py and schedule_feed.py.
+
+Kept free of Streamlit so the feed server can import it without the app.
+"""
+import datetime
+import json
+import sqlite3
+
+DB_PATH = 'tennis_saturday.db'
+
+# Session time slots; a player's availability is stored as a bitmask over these
+# (bit i set = available for SESSION_TIMES[i])
+SESSION_TIMES = ['4:00-4:30 PM', '4:30-5:00 PM', '5:00-5:30 PM', '5:30-6:00 PM']
+# Same slots as minutes past midnight, for matching against the court calendar
+SESSION_MINUTES = [(16 * 60, 16 * 60 + 30), (16 * 60 + 30, 17 * 60),
+                   (17 * 60, 17 * 60 + 30), (17 * 60 + 30, 18 * 60)]
+
+# Function to get the next upcoming Saturday
+def get_next_saturday():
+    today = datetime.date.today()
+    next_saturday = today + datetime.timedelta((5 - today.weekday()) % 7)
+    return next_saturday
+
+# Function to list (court, players) for a session; older schedules stored a
+# plain list of matchups for courts A, B, C, D
+def session_matchups(matchups):
+    if isinstance(matchups, dict):
+        return list(matchups.items())
+    return [(chr(65+i), matchup) for i, matchup in enumerate(matchups)]
+
+# Function to create the schedules table, adding updated_at (used by the feed's
+# Last-Modified/ETag headers) to databases created before it existed. Shared so
+# the feed can run against a database the app hasn't migrated yet.
+def migrate_schedules_table(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS schedules
+                 (date TEXT PRIMARY KEY, schedule_data TEXT, updated_at TEXT)''')
+    columns = [row[1] for row in c.execute("PRAGMA table_info(schedules)")]
+    if 'updated_at' not in columns:
+        c.execute("ALTER TABLE schedules ADD COLUMN updated_at TEXT")
+
+def load_schedule_from_db(date):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT schedule_data FROM schedules WHERE date = ?", (date,))
+    result = c.fetchone()
+    conn.close()
+    if result:
+        schedule = json.loads(result[0])
+        # Convert keys back to integers
+        schedule = {int(k): v for k, v in schedule.items()}
+        return schedule
+    return None
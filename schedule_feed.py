@@ -0,0 +1,191 @@
+"""Read-only JSON and iCalendar feed of published Saturday schedules.
+
+Serves the schedule stored by tennis_saturday.py without a Streamlit session:
+
+    /schedule.json                  next Saturday's schedule
+    /schedule/2024-06-01.json       schedule for a given date
+    /schedule/2024-06-01/Dan.ics    one player's matches as an iCalendar feed
+
+Responses carry ETag and Last-Modified headers taken from the schedule row,
+so polling clients get a 304 Not Modified after a single indexed lookup.
+
+Run standalone with `python schedule_feed.py [port]`, or set TENNIS_FEED_PORT
+and the Streamlit app starts it in a background thread.
+"""
+import datetime
+import email.utils
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from saturday_schedule import (DB_PATH, SESSION_TIMES, SESSION_MINUTES, get_next_saturday,
+                               load_schedule_from_db, migrate_schedules_table, session_matchups)
+
+MAX_AGE = 60
+# RFC 5545 content lines are at most 75 octets, excluding the line break
+ICS_LINE_OCTETS = 75
+
+# Function to make sure the schedules table has the columns the feed reads
+def init_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    migrate_schedules_table(c)
+    conn.commit()
+    conn.close()
+
+# Function to get the cache validators for a date without parsing the schedule.
+# The ETag hashes the stored data itself, since updated_at only has one-second
+# resolution; rows saved before updated_at existed get no Last-Modified.
+def get_schedule_version(date):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT schedule_data, updated_at FROM schedules WHERE date = ?", (date,))
+    result = c.fetchone()
+    conn.close()
+    if not result:
+        return None, None
+    schedule_data, updated_at = result
+    etag = hashlib.sha1(f"{date}|{updated_at}|{schedule_data}".encode()).hexdigest()
+    if updated_at is None:
+        return etag, None
+    updated_at = datetime.datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S").replace(
+        tzinfo=datetime.timezone.utc)
+    return etag, updated_at
+
+def schedule_to_json(schedule, date):
+    sessions = []
+    for session, time in enumerate(SESSION_TIMES):
+        courts = [{'court': court, 'team1': matchup[:2], 'team2': matchup[2:]}
+                  for court, matchup in session_matchups(schedule.get(session, []))]
+        sessions.append({'time': time, 'courts': courts})
+    return json.dumps({'date': date, 'sessions': sessions})
+
+def ics_escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+# Function to fold a content line into 75-octet pieces joined by CRLF and a
+# space, without splitting a UTF-8 character (RFC 5545 section 3.1)
+def fold(line):
+    pieces = []
+    current, size = '', 0
+    for char in line:
+        octets = len(char.encode())
+        if size + octets > ICS_LINE_OCTETS:
+            pieces.append(current)
+            current, size = '', 1  # The leading space counts towards the limit
+        current += char
+        size += octets
+    pieces.append(current)
+    return '\r\n '.join(pieces)
+
+# Function to build an iCalendar feed of one player's matches. Times are
+# floating local times, i.e. whatever time zone the club is in.
+def schedule_to_ics(schedule, date, player, updated_at):
+    day = datetime.datetime.strptime(date, "%Y-%m-%d")
+    stamp = (updated_at or datetime.datetime.now(datetime.timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//TLTC//Saturday Tennis//EN',
+             'CALSCALE:GREGORIAN', f'X-WR-CALNAME:{ics_escape(f"Saturday Tennis - {player}")}']
+    for session, (start, end) in enumerate(SESSION_MINUTES):
+        for court, matchup in session_matchups(schedule.get(session, [])):
+            if player not in matchup:
+                continue
+            dtstart = day + datetime.timedelta(minutes=start)
+            dtend = day + datetime.timedelta(minutes=end)
+            summary = f'Court {court}: {matchup[0]} & {matchup[1]} vs {matchup[2]} & {matchup[3]}'
+            uid = hashlib.sha1(f'{date}|{session}|{player}'.encode()).hexdigest()
+            lines += ['BEGIN:VEVENT', f'UID:{uid}@tltc-saturday', f'DTSTAMP:{stamp}',
+                      f'DTSTART:{dtstart.strftime("%Y%m%dT%H%M%S")}',
+                      f'DTEND:{dtend.strftime("%Y%m%dT%H%M%S")}',
+                      f'SUMMARY:{ics_escape(summary)}', f'LOCATION:{ics_escape(f"Court {court}")}',
+                      'END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+class ScheduleFeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parts = [unquote(part) for part in self.path.split('?')[0].strip('/').split('/')]
+        if parts == ['schedule.json']:
+            date, player = get_next_saturday().strftime("%Y-%m-%d"), None
+        elif len(parts) == 2 and parts[0] == 'schedule' and parts[1].endswith('.json'):
+            date, player = parts[1][:-len('.json')], None
+        elif len(parts) == 3 and parts[0] == 'schedule' and parts[2].endswith('.ics'):
+            date, player = parts[1], parts[2][:-len('.ics')]
+        else:
+            self.send_error(404)
+            return
+        try:
+            datetime.datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            self.send_error(404)
+            return
+
+        etag, updated_at = get_schedule_version(date)
+        if etag is None:
+            self.send_error(404, "No schedule for this date")
+            return
+        if player:
+            etag = hashlib.sha1(f'{etag}|{player}'.encode()).hexdigest()
+        etag = f'"{etag}"'
+        if self.not_modified(etag, updated_at):
+            self.send_response(304)
+            self.send_cache_headers(etag, updated_at)
+            self.end_headers()
+            return
+
+        schedule = load_schedule_from_db(date)
+        if schedule is None:
+            self.send_error(404, "No schedule for this date")
+            return
+        if player:
+            body = schedule_to_ics(schedule, date, player, updated_at).encode()
+            content_type = 'text/calendar; charset=utf-8'
+        else:
+            body = schedule_to_json(schedule, date).encode()
+            content_type = 'application/json'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_cache_headers(etag, updated_at)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    def not_modified(self, etag, updated_at):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and updated_at:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since is not None and updated_at.replace(microsecond=0) <= since
+        return False
+
+    def send_cache_headers(self, etag, updated_at):
+        self.send_header('ETag', etag)
+        if updated_at:
+            self.send_header('Last-Modified', email.utils.format_datetime(updated_at, usegmt=True))
+        self.send_header('Cache-Control', f'public, max-age={MAX_AGE}')
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_in_background(port):
+    init_db()
+    server = ThreadingHTTPServer(('', port), ScheduleFeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8502
+    init_db()
+    print(f"Serving schedule feed on port {port}")
+    ThreadingHTTPServer(('', port), ScheduleFeedHandler).serve_forever()
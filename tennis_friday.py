@@ -2,7 +2,6 @@ import streamlit as st
 import random
 import pandas as pd
 import datetime
-import hashlib
 import io
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
@@ -11,14 +10,25 @@ from reportlab.platypus import Table, TableStyle
 import base64
 import sqlite3
 import json
+import os
+import time
+from admin_auth import init_auth_tables, check_password, logout_admin
+from event_log import init_event_tables, append_event, is_scheduled, show_history
+from app_metrics import METRICS_ENABLED, METRICS_FILE, timed, record_count, metrics_dataframe, write_prometheus
 
+# Players table columns that make up a sign-up, for the change history
+PLAYER_COLUMNS = ('name',)
+
+@timed
 def init_db():
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS players
                  (id INTEGER PRIMARY KEY, name TEXT, date TEXT)''')
+    init_auth_tables(c)
     c.execute('''CREATE TABLE IF NOT EXISTS schedules
                  (date TEXT PRIMARY KEY, schedule_data TEXT)''')
+    init_event_tables(c, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
     
@@ -33,15 +43,18 @@ def get_next_friday():
     return next_friday
 
 # Function to generate schedule
+@timed
 def generate_schedule(players, num_courts):
     NUM_SESSIONS = 1  # Changed from 4 to 1
     matches = {session: [] for session in range(NUM_SESSIONS)}
     played_pairs = set()
     max_attempts = 1000
+    total_attempts = 0
 
     for session in range(NUM_SESSIONS):
         attempts = 0
         while attempts < max_attempts:
+            total_attempts += 1
             random.shuffle(players)
             session_matches = []
             used_players = set()
@@ -72,11 +85,14 @@ def generate_schedule(players, num_courts):
                 break
             attempts += 1
         else:
+            record_count('generate_schedule_attempts', total_attempts)
             st.error("Unable to generate a schedule without repeating pairs.")
             return None
+    record_count('generate_schedule_attempts', total_attempts)
     return matches
 
 # Function to display the schedule in a transposed DataFrame
+@timed
 def display_schedule_transposed(schedule, num_courts):
     times = ['5:00-6:00 PM']  # Changed to a single time slot
     courts = [f'Court {chr(65+i)}' for i in range(num_courts)]  # A, B, C, D
@@ -104,6 +120,7 @@ def display_schedule_transposed(schedule, num_courts):
     
     return df_transposed
 
+@timed
 def create_pdf(df):
     buffer = io.BytesIO()
     width, height = landscape(letter)  # Use landscape orientation
@@ -152,52 +169,35 @@ def clear_schedule():
     clear_players(formatted_date_for_filename)  # Add this line to clear players
     st.session_state['schedule_generated'] = False
     st.session_state['players'] = []  # Reset the players list in session state
-    if "password_correct" in st.session_state:
-        del st.session_state["password_correct"]
+    logout_admin('tennis_friday.db')
     st.session_state['just_entered_password'] = True
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def check_password():
-    """Returns `True` if the user had the correct password."""
-    if "password_attempts" not in st.session_state:
-        st.session_state["password_attempts"] = 0
-
-    if st.session_state["password_attempts"] >= 3:
-        st.error("Too many incorrect attempts. Please try again later.")
-        return False
-
-    def password_entered():
-        """Checks whether a password entered by the user is correct."""
-        if hash_password(st.session_state["password"]) == st.secrets["password"]:
-            st.session_state["password_correct"] = True
-            del st.session_state["password"]  # Don't store the password.
-        else:
-            st.session_state["password_correct"] = False
-            st.session_state["password_attempts"] += 1
-
-    if "password_correct" not in st.session_state:
-        st.text_input(
-            "Admin Login", type="password", on_change=password_entered, key="password"
-        )
-        return False
-    elif not st.session_state["password_correct"]:
-        st.text_input(
-            "Admin Login", type="password", on_change=password_entered, key="password"
-        )
-        st.error("😕 Password incorrect")
-        return False
-    else:
-        return True
-
+@timed
 def add_player(name, date):
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
     c.execute("INSERT INTO players (name, date) VALUES (?, ?)", (name, date))
+    append_event(c, date, 'signup', {'name': name}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
+# Removing a player who is on the schedule also clears the schedule so it can
+# be regenerated without them
+@timed
+def remove_player(name, date):
+    conn = sqlite3.connect('tennis_friday.db')
+    c = conn.cursor()
+    c.execute("DELETE FROM players WHERE name = ? AND date = ?", (name, date))
+    append_event(c, date, 'remove', {'name': name}, PLAYER_COLUMNS)
+    c.execute("SELECT schedule_data FROM schedules WHERE date = ?", (date,))
+    row = c.fetchone()
+    if row and is_scheduled(name, json.loads(row[0])):
+        c.execute("DELETE FROM schedules WHERE date = ?", (date,))
+        append_event(c, date, 'schedule_cleared', {}, PLAYER_COLUMNS)
+    conn.commit()
+    conn.close()
+
+@timed
 def get_players(date):
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
@@ -206,21 +206,26 @@ def get_players(date):
     conn.close()
     return players
 
+@timed
 def clear_players(date):
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
     c.execute("DELETE FROM players WHERE date = ?", (date,))
+    append_event(c, date, 'players_cleared', {}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
+@timed
 def save_schedule_to_db(schedule, date):
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
     schedule_data = json.dumps(schedule)
     c.execute("REPLACE INTO schedules (date, schedule_data) VALUES (?, ?)", (date, schedule_data))
+    append_event(c, date, 'generate', {'schedule': schedule}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
+@timed
 def load_schedule_from_db(date):
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
@@ -234,10 +239,12 @@ def load_schedule_from_db(date):
         return schedule
     return None
 
+@timed
 def clear_schedule_in_db(date):
     conn = sqlite3.connect('tennis_friday.db')
     c = conn.cursor()
     c.execute("DELETE FROM schedules WHERE date = ?", (date,))
+    append_event(c, date, 'schedule_cleared', {}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
@@ -382,7 +389,7 @@ if len(players) >= 8:
     #    st.write("No schedule has been generated yet.")
 
     # Provide options to generate or clear the schedule, protected by password
-    if check_password():
+    if check_password('tennis_friday.db'):
         #st.write("You are authenticated. You can now generate or clear the schedule.")
         if st.button("🔄  Generate Schedule"):
             schedule = generate_schedule(players_for_schedule, num_courts)
@@ -399,5 +406,21 @@ if len(players) >= 8:
             clear_schedule()
             st.success("🗑️Schedule cleared.")
             st.rerun()
+
+        show_history('tennis_friday.db', formatted_date_for_filename, players,
+                     st.session_state['schedule'] if st.session_state['schedule_generated'] else None,
+                     remove_player, PLAYER_COLUMNS)
+
+        if METRICS_ENABLED:
+            with st.expander("📊  Metrics"):
+                st.dataframe(metrics_dataframe(), hide_index=True)
 else:
     st.write("Waiting for players to sign-up...")
+    # Still let the admin in so a cleared date can be restored
+    if check_password('tennis_friday.db'):
+        show_history('tennis_friday.db', formatted_date_for_filename, players,
+                     None, remove_player, PLAYER_COLUMNS)
+
+# Export metrics at the end of each rerun
+if METRICS_ENABLED and METRICS_FILE:
+    write_prometheus(METRICS_FILE)
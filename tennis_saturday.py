@@ -2,7 +2,6 @@ import streamlit as st
 import random
 import pandas as pd
 import datetime
-import hashlib
 import io
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
@@ -11,14 +10,46 @@ from reportlab.platypus import Table, TableStyle
 import base64
 import sqlite3
 import json
-
+from bisect import bisect_right
+import os
+import time
+import saturday_schedule
+from saturday_schedule import SESSION_TIMES, SESSION_MINUTES, get_next_saturday, session_matchups
+from admin_auth import init_auth_tables, check_password, logout_admin
+from event_log import init_event_tables, append_event, is_scheduled, show_history
+from app_metrics import METRICS_ENABLED, METRICS_FILE, timed, record_count, metrics_dataframe, write_prometheus
+
+NUM_SESSIONS = len(SESSION_TIMES)
+FULL_AVAILABILITY = (1 << NUM_SESSIONS) - 1
+# Court bookings are tagged by event so several groups can share the calendar
+EVENT_NAME = 'Saturday Tennis'
+DEFAULT_COURTS = ['A', 'B', 'C', 'D']
+# Players table columns that make up a sign-up, for the change history
+PLAYER_COLUMNS = ('name', 'availability')
+
+@timed
 def init_db():
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS players
-                 (id INTEGER PRIMARY KEY, name TEXT, date TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS schedules
-                 (date TEXT PRIMARY KEY, schedule_data TEXT)''')
+    c.execute(f'''CREATE TABLE IF NOT EXISTS players
+                 (id INTEGER PRIMARY KEY, name TEXT, date TEXT,
+                  availability INTEGER DEFAULT {FULL_AVAILABILITY})''')
+    init_auth_tables(c)
+    saturday_schedule.migrate_schedules_table(c)
+    # Older databases were created before availability was tracked
+    columns = [row[1] for row in c.execute("PRAGMA table_info(players)")]
+    if 'availability' not in columns:
+        c.execute(f"ALTER TABLE players ADD COLUMN availability INTEGER DEFAULT {FULL_AVAILABILITY}")
+    init_event_tables(c, PLAYER_COLUMNS)
+    c.execute('''CREATE TABLE IF NOT EXISTS courts
+                 (name TEXT PRIMARY KEY)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS court_calendar
+                 (id INTEGER PRIMARY KEY, court TEXT, date TEXT,
+                  start_minute INTEGER, end_minute INTEGER, event TEXT)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_court_calendar_date_event
+                 ON court_calendar (date, event)''')
+    if c.execute("SELECT COUNT(*) FROM courts").fetchone()[0] == 0:
+        c.executemany("INSERT INTO courts (name) VALUES (?)", [(name,) for name in DEFAULT_COURTS])
     conn.commit()
     conn.close()
     
@@ -26,72 +57,222 @@ def img_to_base64(img_path):
     with open(img_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode('utf-8')
     
-# Function to get the next upcoming Saturday
-def get_next_saturday():
-    today = datetime.date.today()
-    next_saturday = today + datetime.timedelta((5 - today.weekday()) % 7)
-    return next_saturday
+def availability_to_mask(selected_times):
+    mask = 0
+    for i, time in enumerate(SESSION_TIMES):
+        if time in selected_times:
+            mask |= 1 << i
+    return mask
+
+def mask_to_times(mask):
+    return [time for i, time in enumerate(SESSION_TIMES) if mask & (1 << i)]
+
+# Function to show a player's name with their times if not available for all sessions
+def format_player(name, availability):
+    mask = availability.get(name, FULL_AVAILABILITY)
+    if mask == FULL_AVAILABILITY:
+        return name
+    return f"{name} ({', '.join(t.split('-')[0] for t in mask_to_times(mask))})"
+
+# Function to build a per-court interval index from calendar bookings.
+# Overlapping or back-to-back bookings are merged so each court maps to sorted,
+# disjoint (starts, ends) lists that can be searched with bisect.
+def build_court_index(bookings):
+    by_court = {}
+    for court, start, end in bookings:
+        by_court.setdefault(court, []).append((start, end))
+    index = {}
+    for court, intervals in by_court.items():
+        intervals.sort()
+        starts, ends = [], []
+        for start, end in intervals:
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        index[court] = (starts, ends)
+    return index
+
+# Function to check whether a court is booked for the whole of [start, end)
+def court_is_booked(index, court, start, end):
+    if court not in index:
+        return False
+    starts, ends = index[court]
+    i = bisect_right(starts, start) - 1
+    return i >= 0 and ends[i] >= end
+
+# Function to get the courts available in each session, or None if nothing has
+# been booked on the calendar for this date
+def get_session_courts(date, courts):
+    bookings = get_court_bookings(date)
+    if not bookings:
+        return None
+    index = build_court_index(bookings)
+    return [[court for court in courts if court_is_booked(index, court, start, end)]
+            for start, end in SESSION_MINUTES]
+
+# Function to fill each session's seats with players so that every player gets
+# at least quota[player] sessions, as a max flow from players (capacity quota)
+# through the sessions they can make (capacity 1) to the seats (capacity
+# seats[session]). Returns the players per session, or None if infeasible.
+def assign_seats(players, available, quota, seats):
+    members = [set() for _ in range(NUM_SESSIONS)]
+    remaining = dict(quota)
+
+    # Augmenting path: put player in a session with a free seat, or in a full
+    # session after moving one of its players to another session
+    def augment(player, visited):
+        for session in available[player]:
+            if session in visited or player in members[session]:
+                continue
+            visited.add(session)
+            if len(members[session]) < seats[session]:
+                members[session].add(player)
+                return True
+            for other in list(members[session]):
+                if augment(other, visited):
+                    members[session].remove(other)
+                    members[session].add(player)
+                    return True
+        return False
+
+    progress = True
+    while progress:
+        progress = False
+        for player in players:
+            if remaining[player] and augment(player, set()):
+                remaining[player] -= 1
+                progress = True
+    if any(remaining.values()):
+        return None
+    return [[p for p in players if p in member] for member in members]
+
+# Function to pick who plays each session so byes are shared as evenly as
+# availability allows: find the smallest bye cap k where everyone can play
+# min(sessions they can make, NUM_SESSIONS - k) times, then give any seats
+# still free to whoever has played least
+def assign_sessions(players, availability, seats):
+    order = players[:]
+    random.shuffle(order)  # Random tie-breaks so byes don't follow sign-up order
+    available = {p: [s for s in range(NUM_SESSIONS) if availability.get(p, FULL_AVAILABILITY) & (1 << s)]
+                 for p in order}
+    for cap in range(NUM_SESSIONS + 1):
+        quota = {p: min(len(available[p]), NUM_SESSIONS - cap) for p in order}
+        assignment = assign_seats(order, available, quota, seats)
+        if assignment is not None:
+            break
+    plays = {p: sum(p in session_players for session_players in assignment) for p in order}
+    for session, session_players in enumerate(assignment):
+        candidates = [p for p in order if session in available[p] and p not in session_players]
+        candidates.sort(key=lambda p: plays[p])
+        for player in candidates[:seats[session] - len(session_players)]:
+            session_players.append(player)
+            plays[player] += 1
+    return assignment
+
+# Function to get the courts to use in each session: up to num_courts of the
+# available courts, dropping courts where too few players can make that session
+def get_session_courts_used(players, availability, num_courts, session_courts):
+    courts_used = []
+    for session in range(NUM_SESSIONS):
+        bit = 1 << session
+        available_count = sum(1 for p in players if availability.get(p, FULL_AVAILABILITY) & bit)
+        courts_used.append(session_courts[session][:min(num_courts, available_count // 4)])
+    return courts_used
 
 # Function to generate schedule
-def generate_schedule(players, num_courts):
-    NUM_SESSIONS = 4
-    matches = {session: [] for session in range(NUM_SESSIONS)}
+# Players are taken in sign-up order for each session, skipping anyone whose
+# availability bitmask excludes that session; everyone else rests.
+# With rotate_subs, who plays when is decided up front by assign_sessions,
+# which keeps the most byes any player gets (beyond the sessions they can't
+# make) as low as possible.
+# session_courts lists the court names available in each session; at most
+# num_courts of them are used, fewer if not enough players can make a session.
+# Defaults to courts A, B, C, ... every session.
+@timed
+def generate_schedule(players, num_courts, availability=None, rotate_subs=False,
+                      session_courts=None):
+    if availability is None:
+        availability = {}
+    if session_courts is None:
+        session_courts = [[chr(65+i) for i in range(num_courts)]] * NUM_SESSIONS
+    matches = {session: {} for session in range(NUM_SESSIONS)}
     played_pairs = set()
     max_attempts = 1000
+    total_attempts = 0
+
+    courts_used = get_session_courts_used(players, availability, num_courts, session_courts)
+    seats = [len(courts) * 4 for courts in courts_used]
+    available_players = [[p for p in players if availability.get(p, FULL_AVAILABILITY) & (1 << session)]
+                         for session in range(NUM_SESSIONS)]
+    if rotate_subs:
+        session_lineups = assign_sessions(players, availability, seats)
+    else:
+        session_lineups = [available_players[session][:seats[session]] for session in range(NUM_SESSIONS)]
 
     for session in range(NUM_SESSIONS):
+        courts = courts_used[session]
+        session_players = session_lineups[session]
+
         attempts = 0
         while attempts < max_attempts:
-            random.shuffle(players)
-            session_matches = []
-            used_players = set()
+            total_attempts += 1
+            random.shuffle(session_players)
+            session_matches = {}
+            session_pairs = []
             valid = True
 
-            for court in range(num_courts):
-                court_players = []
-                for _ in range(4):
-                    for player in players:
-                        if player not in used_players:
-                            court_players.append(player)
-                            used_players.add(player)
-                            break
-                if len(court_players) < 4:
-                    valid = False
-                    break
+            for i, court in enumerate(courts):
+                court_players = session_players[i * 4:i * 4 + 4]
                 pair1 = (court_players[0], court_players[1])
                 pair2 = (court_players[2], court_players[3])
                 if (pair1 not in played_pairs and pair2 not in played_pairs and
                     pair1[::-1] not in played_pairs and pair2[::-1] not in played_pairs):
-                    session_matches.append(court_players)
+                    session_matches[court] = court_players
+                    session_pairs.extend([pair1, pair2])
                 else:
                     valid = False
                     break
             if valid:
                 matches[session] = session_matches
-                played_pairs.update([pair1, pair2])
+                played_pairs.update(session_pairs)
                 break
             attempts += 1
         else:
+            record_count('generate_schedule_attempts', total_attempts)
             st.error("Unable to generate a schedule without repeating pairs.")
             return None
+    record_count('generate_schedule_attempts', total_attempts)
     return matches
 
 # Function to display the schedule in a transposed DataFrame
-def display_schedule_transposed(schedule, num_courts):
-    times = ['4:00-4:30 PM', '4:30-5:00 PM', '5:00-5:30 PM', '5:30-6:00 PM']
-    courts = [f'Court {chr(65+i)}' for i in range(num_courts)]  # A, B, C, D
+@timed
+def display_schedule_transposed(schedule, players=None):
+    times = SESSION_TIMES
+    # Only show the courts that were used in at least one session
+    court_names = sorted({court for matchups in schedule.values()
+                          for court, _ in session_matchups(matchups)})
+    courts = [f'Court {name}' for name in court_names]
     
     # Initialize a DataFrame with the correct size for the number of courts and sessions
     df = pd.DataFrame(index=courts, columns=times)
     
     for session_key, matchups in schedule.items():
         session = int(session_key)  # Convert session key to integer
-        for court in range(len(matchups)):
-            matchup = matchups[court]
+        for court, matchup in session_matchups(matchups):
             team1 = f'{matchup[0]} & {matchup[1]}'
             team2 = f'{matchup[2]} & {matchup[3]}'
-            if court < len(courts) and session < len(times):
-                df.iloc[court, session] = f'{team1} vs {team2}'
+            if session < len(times):
+                df.loc[f'Court {court}', times[session]] = f'{team1} vs {team2}'
+    
+    # List who sits out each session (unavailable players and subs)
+    if players:
+        resting = []
+        for session in range(len(times)):
+            playing = {p for _, matchup in session_matchups(schedule.get(session, [])) for p in matchup}
+            resting.append(', '.join(p for p in players if p not in playing))
+        df.loc['Resting'] = resting
     
     # Transpose the DataFrame
     df_transposed = df.transpose()
@@ -104,6 +285,7 @@ def display_schedule_transposed(schedule, num_courts):
     
     return df_transposed
 
+@timed
 def create_pdf(df):
     buffer = io.BytesIO()
     width, height = landscape(letter)  # Use landscape orientation
@@ -152,52 +334,36 @@ def clear_schedule():
     clear_players(formatted_date_for_filename)  # Add this line to clear players
     st.session_state['schedule_generated'] = False
     st.session_state['players'] = []  # Reset the players list in session state
-    if "password_correct" in st.session_state:
-        del st.session_state["password_correct"]
+    logout_admin('tennis_saturday.db')
     st.session_state['just_entered_password'] = True
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def check_password():
-    """Returns `True` if the user had the correct password."""
-    if "password_attempts" not in st.session_state:
-        st.session_state["password_attempts"] = 0
-
-    if st.session_state["password_attempts"] >= 3:
-        st.error("Too many incorrect attempts. Please try again later.")
-        return False
-
-    def password_entered():
-        """Checks whether a password entered by the user is correct."""
-        if hash_password(st.session_state["password"]) == st.secrets["password"]:
-            st.session_state["password_correct"] = True
-            del st.session_state["password"]  # Don't store the password.
-        else:
-            st.session_state["password_correct"] = False
-            st.session_state["password_attempts"] += 1
-
-    if "password_correct" not in st.session_state:
-        st.text_input(
-            "Admin Login", type="password", on_change=password_entered, key="password"
-        )
-        return False
-    elif not st.session_state["password_correct"]:
-        st.text_input(
-            "Admin Login", type="password", on_change=password_entered, key="password"
-        )
-        st.error("😕 Password incorrect")
-        return False
-    else:
-        return True
+@timed
+def add_player(name, date, availability=FULL_AVAILABILITY):
+    conn = sqlite3.connect('tennis_saturday.db')
+    c = conn.cursor()
+    c.execute("INSERT INTO players (name, date, availability) VALUES (?, ?, ?)",
+              (name, date, availability))
+    append_event(c, date, 'signup', {'name': name, 'availability': availability}, PLAYER_COLUMNS)
+    conn.commit()
+    conn.close()
 
-def add_player(name, date):
+# Removing a player who is on the schedule also clears the schedule so it can
+# be regenerated without them
+@timed
+def remove_player(name, date):
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
-    c.execute("INSERT INTO players (name, date) VALUES (?, ?)", (name, date))
+    c.execute("DELETE FROM players WHERE name = ? AND date = ?", (name, date))
+    append_event(c, date, 'remove', {'name': name}, PLAYER_COLUMNS)
+    c.execute("SELECT schedule_data FROM schedules WHERE date = ?", (date,))
+    row = c.fetchone()
+    if row and is_scheduled(name, json.loads(row[0])):
+        c.execute("DELETE FROM schedules WHERE date = ?", (date,))
+        append_event(c, date, 'schedule_cleared', {}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
+@timed
 def get_players(date):
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
@@ -206,44 +372,113 @@ def get_players(date):
     conn.close()
     return players
 
+@timed
+def get_player_availability(date):
+    conn = sqlite3.connect('tennis_saturday.db')
+    c = conn.cursor()
+    c.execute("SELECT name, availability FROM players WHERE date = ?", (date,))
+    availability = {row[0]: FULL_AVAILABILITY if row[1] is None else row[1] for row in c.fetchall()}
+    conn.close()
+    return availability
+
+@timed
 def clear_players(date):
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
     c.execute("DELETE FROM players WHERE date = ?", (date,))
+    append_event(c, date, 'players_cleared', {}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
+@timed
 def save_schedule_to_db(schedule, date):
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
     schedule_data = json.dumps(schedule)
-    c.execute("REPLACE INTO schedules (date, schedule_data) VALUES (?, ?)", (date, schedule_data))
+    updated_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    c.execute("REPLACE INTO schedules (date, schedule_data, updated_at) VALUES (?, ?, ?)",
+              (date, schedule_data, updated_at))
+    append_event(c, date, 'generate', {'schedule': schedule}, PLAYER_COLUMNS)
+    conn.commit()
+    conn.close()
+
+load_schedule_from_db = timed(saturday_schedule.load_schedule_from_db)
+
+@timed
+def get_courts():
+    conn = sqlite3.connect('tennis_saturday.db')
+    c = conn.cursor()
+    c.execute("SELECT name FROM courts ORDER BY name")
+    courts = [row[0] for row in c.fetchall()]
+    conn.close()
+    return courts
+
+@timed
+def add_court(name):
+    conn = sqlite3.connect('tennis_saturday.db')
+    c = conn.cursor()
+    c.execute("INSERT OR IGNORE INTO courts (name) VALUES (?)", (name,))
     conn.commit()
     conn.close()
 
-def load_schedule_from_db(date):
+# Books a court unless another event already holds it for part of that time;
+# returns the name of the conflicting event, or None if the booking was made
+@timed
+def book_court(court, date, start_minute, end_minute, event=EVENT_NAME):
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
-    c.execute("SELECT schedule_data FROM schedules WHERE date = ?", (date,))
-    result = c.fetchone()
+    c.execute("SELECT event FROM court_calendar WHERE date = ? AND court = ? AND event != ? "
+              "AND start_minute < ? AND end_minute > ? LIMIT 1",
+              (date, court, event, end_minute, start_minute))
+    conflict = c.fetchone()
+    if conflict:
+        conn.close()
+        return conflict[0]
+    c.execute("INSERT INTO court_calendar (court, date, start_minute, end_minute, event) VALUES (?, ?, ?, ?, ?)",
+              (court, date, start_minute, end_minute, event))
+    conn.commit()
     conn.close()
-    if result:
-        schedule = json.loads(result[0])
-        # Convert keys back to integers
-        schedule = {int(k): v for k, v in schedule.items()}
-        return schedule
     return None
 
+@timed
+def get_court_bookings(date, event=EVENT_NAME):
+    conn = sqlite3.connect('tennis_saturday.db')
+    c = conn.cursor()
+    c.execute("SELECT court, start_minute, end_minute FROM court_calendar WHERE date = ? AND event = ?",
+              (date, event))
+    bookings = c.fetchall()
+    conn.close()
+    return bookings
+
+@timed
+def clear_court_bookings(date, event=EVENT_NAME):
+    conn = sqlite3.connect('tennis_saturday.db')
+    c = conn.cursor()
+    c.execute("DELETE FROM court_calendar WHERE date = ? AND event = ?", (date, event))
+    conn.commit()
+    conn.close()
+
+@timed
 def clear_schedule_in_db(date):
     conn = sqlite3.connect('tennis_saturday.db')
     c = conn.cursor()
     c.execute("DELETE FROM schedules WHERE date = ?", (date,))
+    append_event(c, date, 'schedule_cleared', {}, PLAYER_COLUMNS)
     conn.commit()
     conn.close()
 
 # Initialize the database
 init_db()
 
+# Start the read-only JSON/iCalendar feed once per process if a port is configured
+@st.cache_resource
+def start_feed_server(port):
+    import schedule_feed
+    return schedule_feed.serve_in_background(port)
+
+if os.environ.get('TENNIS_FEED_PORT'):
+    start_feed_server(int(os.environ['TENNIS_FEED_PORT']))
+
 # Get the date of the next upcoming Saturday
 next_saturday = get_next_saturday()
 formatted_date = next_saturday.strftime("%A, %B %d, %Y")
@@ -256,6 +491,7 @@ if 'players' not in st.session_state:
 # Load players from the database
 players = get_players(formatted_date_for_filename)
 st.session_state['players'] = players
+availability = get_player_availability(formatted_date_for_filename)
 
 # Load schedule from the database
 schedule = load_schedule_from_db(formatted_date_for_filename)
@@ -333,11 +569,20 @@ if len(players) < MAX_PLAYERS:
             key='new_player',
             label_visibility="collapsed"
         )
+        available_times = st.multiselect(
+            "Available for:",
+            SESSION_TIMES,
+            default=SESSION_TIMES,
+            key='available_times'
+        )
         submit = st.form_submit_button("✋  I'm in!")
 
         if submit:
-            if new_player and new_player not in players:
-                add_player(new_player, formatted_date_for_filename)
+            if new_player and new_player not in players and not available_times:
+                st.error("Please select at least one time you are available.")
+            elif new_player and new_player not in players:
+                add_player(new_player, formatted_date_for_filename,
+                           availability_to_mask(available_times))
                 players = get_players(formatted_date_for_filename)  # Refresh the player list
                 st.session_state['players'] = players  # Update session state
                 st.rerun()
@@ -348,26 +593,25 @@ if len(players) < MAX_PLAYERS:
                 st.rerun()
 
 # Display the list of players so far
-st.write(f"Current players ({len(players)}/{MAX_PLAYERS}): {', '.join(players)}")
+st.write(f"Current players ({len(players)}/{MAX_PLAYERS}): {', '.join(format_player(p, availability) for p in players)}")
 
 # Step 2: Generate and display schedule when enough players have signed up
 if len(players) >= 8:
-    if len(players) % 4 != 0:
-        subs = players[len(players) // 4 * 4:]  # Extra players are substitutes
-        players_for_schedule = players[:len(players) // 4 * 4]
-    else:
-        subs = []
-        players_for_schedule = players
-
-    num_courts = len(players_for_schedule) // 4
+    # Extra players beyond a multiple of 4 are substitutes, but they fill in
+    # for anyone who is unavailable for a session
+    num_courts = len(players) // 4
 
     # Check if schedule exists
     if st.session_state['schedule_generated']:
         # Schedule exists, display it
         schedule = st.session_state['schedule']
-        df_transposed = display_schedule_transposed(schedule, num_courts)
+        df_transposed = display_schedule_transposed(schedule, players)
         st.dataframe(df_transposed, hide_index=True)
         
+        # Subs are whoever did not get onto a court in any session
+        scheduled = {p for matchups in schedule.values()
+                     for _, matchup in session_matchups(matchups) for p in matchup}
+        subs = [p for p in players if p not in scheduled]
         if subs:
             st.write(f"Substitutes: {', '.join(subs)}")
         
@@ -383,10 +627,57 @@ if len(players) >= 8:
     #    st.write("No schedule has been generated yet.")
 
     # Provide options to generate or clear the schedule, protected by password
-    if check_password():
+    if check_password('tennis_saturday.db'):
         #st.write("You are authenticated. You can now generate or clear the schedule.")
+        rotate_subs = st.checkbox(
+            "Rotate subs in (everyone plays, byes shared evenly)",
+            value=len(players) % 4 != 0,
+            key='rotate_subs'
+        )
+        courts = get_courts()
+        with st.expander("🏟️  Courts booked for this date"):
+            booked_courts = st.multiselect("Courts", courts, key='booked_courts')
+            booked_times = st.multiselect("Times", SESSION_TIMES, default=SESSION_TIMES, key='booked_times')
+            if st.button("Book courts"):
+                conflicts = []
+                for court in booked_courts:
+                    for slot in booked_times:
+                        start, end = SESSION_MINUTES[SESSION_TIMES.index(slot)]
+                        other_event = book_court(court, formatted_date_for_filename, start, end)
+                        if other_event:
+                            conflicts.append(f"Court {court} at {slot} ({other_event})")
+                st.session_state['booking_conflicts'] = conflicts
+                st.rerun()
+            if st.session_state.get('booking_conflicts'):
+                st.warning("Already booked by another event, not booked: "
+                           + '; '.join(st.session_state['booking_conflicts']))
+            session_courts = get_session_courts(formatted_date_for_filename, courts)
+            if session_courts is None:
+                st.write(f"No bookings yet; using courts {', '.join(courts[:num_courts])}.")
+            else:
+                for slot, available in zip(SESSION_TIMES, session_courts):
+                    st.write(f"{slot}: {', '.join(available) or 'no courts'}")
+                if st.button("Clear bookings"):
+                    clear_court_bookings(formatted_date_for_filename)
+                    st.rerun()
+            new_court = st.text_input("Add a court to the club inventory", key='new_court')
+            if st.button("Add court") and new_court:
+                add_court(new_court)
+                st.rerun()
+        if session_courts is None:
+            session_courts = [courts[:num_courts]] * NUM_SESSIONS
+        no_courts = [slot for slot, available in zip(SESSION_TIMES, session_courts) if not available]
+        if no_courts:
+            st.warning(f"No courts booked for {', '.join(no_courts)}; no matches will be scheduled then.")
+        courts_used = get_session_courts_used(players, availability, num_courts, session_courts)
+        for session, (slot, available, used) in enumerate(zip(SESSION_TIMES, session_courts, courts_used)):
+            if len(used) < min(num_courts, len(available)):
+                available_count = sum(1 for p in players if availability.get(p, FULL_AVAILABILITY) & (1 << session))
+                st.warning(f"Only {available_count} players can make {slot}, so it will use "
+                           f"{len(used)} court(s) and the rest will sit out.")
+
         if st.button("🔄  Generate Schedule"):
-            schedule = generate_schedule(players_for_schedule, num_courts)
+            schedule = generate_schedule(players, num_courts, availability, rotate_subs, session_courts)
             if schedule:
                 save_schedule_to_db(schedule, formatted_date_for_filename)
                 st.session_state['schedule_generated'] = True
@@ -400,5 +691,21 @@ if len(players) >= 8:
             clear_schedule()
             st.success("🗑️Schedule cleared.")
             st.rerun()
+
+        show_history('tennis_saturday.db', formatted_date_for_filename, players,
+                     st.session_state['schedule'] if st.session_state['schedule_generated'] else None,
+                     remove_player, PLAYER_COLUMNS)
+
+        if METRICS_ENABLED:
+            with st.expander("📊  Metrics"):
+                st.dataframe(metrics_dataframe(), hide_index=True)
 else:
     st.write("Waiting for players to sign-up...")
+    # Still let the admin in so a cleared date can be restored
+    if check_password('tennis_saturday.db'):
+        show_history('tennis_saturday.db', formatted_date_for_filename, players,
+                     None, remove_player, PLAYER_COLUMNS)
+
+# Export metrics at the end of each rerun
+if METRICS_ENABLED and METRICS_FILE:
+    write_prometheus(METRICS_FILE)